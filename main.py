@@ -1,5 +1,7 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
@@ -7,18 +9,86 @@ import logging
 from typing import List, Dict
 import os
 import time
+import asyncio
+import math
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import intel_extension_for_pytorch as ipex  # Optional, Intel CPUs only
+except ImportError:
+    ipex = None
+
+try:
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForSequenceClassification  # Optional ONNX Runtime backend
+except ImportError:
+    ORTModelForSequenceClassification = None
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def available_cpus() -> int:
+    """CPUs this process can actually use, honouring CPU affinity and the container's cgroup quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS/Windows
+        cpus = os.cpu_count() or 1
+    
+    # cgroup v2 ("150000 100000" or "max 100000"), then cgroup v1
+    quota_files = [
+        ("/sys/fs/cgroup/cpu.max", None),
+        ("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "/sys/fs/cgroup/cpu/cpu.cfs_period_us"),
+    ]
+    for quota_file, period_file in quota_files:
+        try:
+            with open(quota_file) as f:
+                values = f.read().split()
+            if period_file:
+                with open(period_file) as f:
+                    values.append(f.read().strip())
+            quota, period = values[0], values[1]
+            if quota not in ("max", "-1"):
+                cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+            break
+        except (OSError, ValueError, IndexError):
+            continue
+    
+    return cpus
+
+def resolve_num_threads() -> int:
+    """Intra-op thread count from OMP_NUM_THREADS, defaulting to one per physical core"""
+    value = os.environ.get("OMP_NUM_THREADS", "")
+    try:
+        # OMP_NUM_THREADS may be a nested list like "4,1"; only the outer level applies here
+        threads = int(value.split(",")[0])
+        if threads > 0:
+            return threads
+    except ValueError:
+        pass
+    if value:
+        logger.warning(f"Invalid OMP_NUM_THREADS '{value}', using the default thread count")
+    # Half the usable CPUs skips hyperthread siblings
+    return max(1, available_cpus() // 2)
+
+# Use one intra-op thread per physical core (not per hyperthread) to avoid
+# oversubscribing the CPU, and keep inter-op parallelism to a single thread
+NUM_THREADS = resolve_num_threads()
+torch.set_num_threads(NUM_THREADS)
+try:
+    torch.set_num_interop_threads(1)
+except RuntimeError:
+    pass  # Already set, e.g. when the module is imported a second time
+
 # Create FastAPI app with /api prefix
 app = FastAPI(
     title="Emotion Analysis API",
     version="1.0.0",
     docs_url="/api/docs",  # Swagger UI at /api/docs
     redoc_url="/api/redoc",  # ReDoc at /api/redoc
-    openapi_url="/api/openapi.json"  # OpenAPI schema at /api/openapi.json
+    openapi_url="/api/openapi.json",  # OpenAPI schema at /api/openapi.json
+    default_response_class=ORJSONResponse  # Serialize responses with orjson
 )
 
 # Add CORS middleware
@@ -30,11 +100,56 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses, e.g. predictions echoing back long input text
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# Model on the Hugging Face Hub, and the local safetensors copy baked in by `python setup.py --bake-model`
+MODEL_NAME = "wncelrcn/mindmap-MiniLM-goemotions-v1"
+MODEL_DIR = os.environ.get("MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_dir"))
+
+# Int8-quantized ONNX export of the model, also created by `python setup.py --bake-model`
+ONNX_MODEL_DIR = os.environ.get("ONNX_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_onnx_q"))
+ONNX_MODEL_FILE = "model_quantized.onnx"
+
 # Global variables for model and tokenizer
 model = None
 tokenizer = None
-model_loading = False
 model_load_error = None
+PRELOAD_MODEL = os.environ.get("PRELOAD_MODEL") == "1"  # Load at import time for `gunicorn --preload`
+model_preloaded = False  # True when loaded at import time by a pre-forking server
+LABEL_LIST = None  # Resolved once at load time, index-aligned with the model's outputs
+BUCKET_BUFFERS = {}  # Preallocated (input_ids, attention_mask) tensors per sequence bucket
+
+# Model loading state, created at startup so they bind to the server's event loop
+model_ready = None  # asyncio.Event set once the model can serve requests
+model_load_lock = None  # asyncio.Lock so concurrent callers share a single load
+model_load_task = None  # Background preload task, referenced so it isn't garbage collected
+
+# Inputs with fewer non-whitespace characters than this skip the model and are labelled neutral
+MIN_TEXT_LENGTH = 3
+
+# Micro-batching settings for /api/predict
+MAX_BATCH_SIZE = 16  # Maximum number of requests per forward pass
+BATCH_MAX_WAIT = 0.02  # Seconds to wait for more requests before running a batch
+
+# Fixed sequence lengths inputs are padded to, so the traced model only sees a few shapes
+SEQUENCE_BUCKETS = (32, 64, 128, 256, 512)
+
+# Inference precision: "auto", "bf16", "int8" or "fp32"
+MODEL_PRECISION = os.environ.get("MODEL_PRECISION", "auto").lower()
+
+# Inference backend: "auto" (ONNX Runtime when exported, else PyTorch), "onnx" or "torch"
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "auto").lower()
+
+# Queue of (token ids, future) items consumed by the batch worker
+batch_queue = None
+batch_worker_task = None
+
+# Single dedicated thread for model loading and forward passes. OpenMP keeps a
+# thread team per calling thread, so running inference on one thread keeps a
+# single team of NUM_THREADS, and batches never queue behind tokenization jobs
+# in the default executor. It also guarantees only one batch runs at a time.
+inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
 
 # GoEmotions emotion labels (27 emotions + neutral)
 GOEMOTIONS_LABELS = [
@@ -57,65 +172,316 @@ class EmotionResponse(BaseModel):
     emotions: List[EmotionPrediction]
     text_analyzed: str
 
-async def load_model_async():
-    """Load the emotion analysis model asynchronously"""
-    global model, tokenizer, model_loading, model_load_error
-    
-    if model is not None and tokenizer is not None:
-        return  # Already loaded
+def optimize_model_precision(model):
+    """
+    Lower the precision of the model's Linear layers for faster CPU inference.
+    Tokenization is unchanged: input_ids and attention_mask stay int64 and only
+    the Linear matmuls switch precision.
+    """
+    precision = MODEL_PRECISION
+    if precision == "auto":
+        # bf16 needs native CPU support, otherwise int8 dynamic quantization is the safe default
+        precision = "bf16" if torch.cpu._is_avx512_bf16_supported() else "int8"
     
-    if model_loading:
-        return  # Already loading
+    if precision == "bf16":
+        logger.info("Casting model weights to bfloat16...")
+        if ipex is not None:
+            # IPEX casts the weights itself and prepacks them for its fused kernels
+            return ipex.optimize(model, dtype=torch.bfloat16)
+        return model.to(torch.bfloat16)
+    if precision == "int8":
+        logger.info("Applying int8 dynamic quantization to Linear layers...")
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if precision != "fp32":
+        logger.warning(f"Unknown MODEL_PRECISION '{MODEL_PRECISION}', keeping fp32 weights")
+    if ipex is not None:
+        return ipex.optimize(model)
+    return model
+
+@lru_cache(maxsize=128)
+def logit_threshold(threshold: float) -> float:
+    """Map a probability threshold to logit space, since sigmoid(x) > t exactly when x > logit(t)"""
+    if threshold <= 0:
+        return -math.inf
+    if threshold >= 1:
+        return math.inf
+    return math.log(threshold / (1 - threshold))
+
+def get_bucket(length: int) -> int:
+    """Return the smallest sequence bucket that fits the given token length"""
+    return next((b for b in SEQUENCE_BUCKETS if b >= length), SEQUENCE_BUCKETS[-1])
+
+def use_onnx_backend() -> bool:
+    """Whether to serve the exported ONNX Runtime model instead of PyTorch"""
+    if MODEL_BACKEND == "torch":
+        return False
+    if MODEL_BACKEND not in ("auto", "onnx"):
+        logger.warning(f"Unknown MODEL_BACKEND '{MODEL_BACKEND}', using PyTorch")
+        return False
+    # An explicit MODEL_PRECISION only applies to PyTorch, so it selects that backend
+    if MODEL_BACKEND == "auto" and MODEL_PRECISION != "auto":
+        return False
     
-    model_loading = True
-    model_load_error = None
+    available = ORTModelForSequenceClassification is not None and os.path.isdir(ONNX_MODEL_DIR)
+    if MODEL_BACKEND == "onnx" and not available:
+        logger.warning(f"ONNX Runtime backend unavailable (needs optimum[onnxruntime] and {ONNX_MODEL_DIR}), using PyTorch")
+    return available
+
+def load_onnx_model():
+    """Load the int8-quantized ONNX export with ONNX Runtime on CPU"""
+    logger.info(f"Loading ONNX Runtime model from {ONNX_MODEL_DIR}...")
+    session_options = onnxruntime.SessionOptions()
+    session_options.intra_op_num_threads = torch.get_num_threads()
+    return ORTModelForSequenceClassification.from_pretrained(
+        ONNX_MODEL_DIR,
+        file_name=ONNX_MODEL_FILE,
+        provider="CPUExecutionProvider",
+        session_options=session_options
+    )
+
+def trace_model(model, tokenizer):
+    """
+    Trace the model with TorchScript to remove per-module Python dispatch, then
+    run a few warmup passes so the first real request doesn't pay the JIT
+    optimization cost. Falls back to the eager model if tracing or warmup fails.
+    """
+    dummy = tokenizer("warmup", return_tensors="pt", padding="max_length", max_length=64)
+    example_inputs = (dummy["input_ids"], dummy["attention_mask"])
     
     try:
-        logger.info("Starting model download and loading...")
-        start_time = time.time()
-        
-        # Load the model and tokenizer with timeout handling
-        model_name = "wncelrcn/mindmap-MiniLM-goemotions-v1"
+        logger.info("Tracing model with TorchScript...")
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example_inputs, strict=False)
         
-        logger.info("Loading tokenizer...")
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name,
-            cache_dir="/tmp/transformers_cache"  # Use tmp for faster access
-        )
+        logger.info("Running warmup passes...")
+        with torch.jit.optimized_execution(True), torch.inference_mode():
+            # Warm up every bucket at both a single request and a full batch, the
+            # shapes the batch worker produces, so live traffic doesn't profile them
+            for bucket in SEQUENCE_BUCKETS:
+                for batch_size in (1, MAX_BATCH_SIZE):
+                    warmup_ids = torch.full((batch_size, bucket), tokenizer.pad_token_id or 0, dtype=torch.long)
+                    warmup_mask = torch.ones((batch_size, bucket), dtype=torch.long)
+                    for _ in range(3):
+                        traced(warmup_ids, warmup_mask)
         
+        return traced
+    except Exception as e:
+        logger.warning(f"Could not trace model, using eager mode: {str(e)}")
+    
+    # Run one eager pass so a broken model fails the load instead of every request
+    with torch.inference_mode():
+        model(*example_inputs)
+    
+    return model
+
+def load_model():
+    """Download, optimize and warm up the emotion analysis model (blocking)"""
+    global model, tokenizer, LABEL_LIST, BUCKET_BUFFERS
+    
+    logger.info("Starting model download and loading...")
+    start_time = time.time()
+    
+    # Prefer the baked local copy, which skips the Hub download entirely
+    if os.path.isdir(MODEL_DIR):
+        logger.info(f"Using local model directory {MODEL_DIR}")
+        model_source = MODEL_DIR
+        source_kwargs = {"local_files_only": True}
+    else:
+        model_source = MODEL_NAME
+        source_kwargs = {"cache_dir": "/tmp/transformers_cache"}  # Use tmp for faster access
+    
+    logger.info("Loading tokenizer...")
+    tokenizer = AutoTokenizer.from_pretrained(
+        model_source,
+        use_fast=True,  # Rust tokenizer, releases the GIL while tokenizing
+        **source_kwargs
+    )
+    
+    # Prefer the quantized ONNX Runtime model when it has been exported
+    use_onnx = use_onnx_backend()
+    
+    if use_onnx:
+        try:
+            model = load_onnx_model()
+        except Exception as e:
+            logger.warning(f"Could not load ONNX Runtime model, using PyTorch: {str(e)}")
+            use_onnx = False
+    
+    if not use_onnx:
         logger.info("Loading model...")
         model = AutoModelForSequenceClassification.from_pretrained(
-            model_name,
-            cache_dir="/tmp/transformers_cache"
+            model_source,
+            torchscript=True,  # Return tuples so the model can be traced
+            **source_kwargs
         )
         model.eval()  # Set to evaluation mode
+        model = optimize_model_precision(model)
+    
+    # Fix the model's label configuration
+    if hasattr(model.config, 'id2label') and len(GOEMOTIONS_LABELS) == len(model.config.id2label):
+        logger.info("Updating model config with proper GoEmotions labels...")
+        model.config.id2label = {i: label for i, label in enumerate(GOEMOTIONS_LABELS)}
+        model.config.label2id = {label: i for i, label in enumerate(GOEMOTIONS_LABELS)}
+        logger.info("Model config updated successfully!")
+    else:
+        logger.warning(f"Could not update model config - size mismatch: model has {len(model.config.id2label) if hasattr(model.config, 'id2label') else 'unknown'} labels, expected {len(GOEMOTIONS_LABELS)}")
+    
+    # Use model's config labels if available, otherwise use our predefined labels
+    labels = getattr(model.config, 'id2label', None)
+    if labels and not any(label.startswith('LABEL_') for label in labels.values()):
+        # Model config has proper labels
+        logger.info("Using model config labels")
+        LABEL_LIST = [labels[i] for i in range(len(labels))]
+    else:
+        # Fall back to our predefined labels
+        logger.info("Using predefined GoEmotions labels")
+        LABEL_LIST = GOEMOTIONS_LABELS
+    
+    # Validate once here so the request path can index labels without checks
+    if model.config.num_labels != len(LABEL_LIST):
+        raise ValueError(f"Model output size ({model.config.num_labels}) doesn't match expected labels ({len(LABEL_LIST)})")
+    
+    if not use_onnx:
+        # ONNX Runtime already runs an optimized graph, so only the PyTorch model is traced
+        model = trace_model(model, tokenizer)
+    
+    # Batches are copied into these instead of allocating fresh tensors per request
+    BUCKET_BUFFERS = {
+        bucket: (
+            torch.zeros(MAX_BATCH_SIZE, bucket, dtype=torch.long),
+            torch.zeros(MAX_BATCH_SIZE, bucket, dtype=torch.long)
+        )
+        for bucket in SEQUENCE_BUCKETS
+    }
+    
+    # Leave the fast tokenizer's padding/truncation state set to the request path's
+    # settings, so concurrent requests never reconfigure (and race on) its Rust backend
+    tokenizer("warmup", truncation=True, max_length=512)
+    
+    load_time = time.time() - start_time
+    logger.info(f"Model loaded successfully in {load_time:.2f} seconds!")
+
+async def load_model_async():
+    """Load the emotion analysis model asynchronously"""
+    global model_load_error
+    
+    # Concurrent callers wait here for the load already in progress
+    async with model_load_lock:
+        if model_ready.is_set():
+            return  # Already loaded
         
-        # Fix the model's label configuration
-        if hasattr(model.config, 'id2label') and len(GOEMOTIONS_LABELS) == len(model.config.id2label):
-            logger.info("Updating model config with proper GoEmotions labels...")
-            model.config.id2label = {i: label for i, label in enumerate(GOEMOTIONS_LABELS)}
-            model.config.label2id = {label: i for i, label in enumerate(GOEMOTIONS_LABELS)}
-            logger.info("Model config updated successfully!")
-        else:
-            logger.warning(f"Could not update model config - size mismatch: model has {len(model.config.id2label) if hasattr(model.config, 'id2label') else 'unknown'} labels, expected {len(GOEMOTIONS_LABELS)}")
+        model_load_error = None
+        try:
+            # Run the blocking load on the inference thread so health checks keep
+            # responding and warmup uses the same OpenMP team as serving
+            await asyncio.get_running_loop().run_in_executor(inference_executor, load_model)
+        except Exception as e:
+            model_load_error = str(e)
+            logger.error(f"Error loading model: {str(e)}")
+            raise e
         
-        load_time = time.time() - start_time
-        logger.info(f"Model loaded successfully in {load_time:.2f} seconds!")
-        logger.info(f"Model config: {model.config}")
+        model_ready.set()
+
+async def preload_model():
+    """Load the model in the background at startup"""
+    try:
+        await load_model_async()
+    except Exception:
+        pass  # Already logged and reported through /api/health
+
+# With PRELOAD_MODEL=1 and `gunicorn --preload`, load the model once in the master
+# process; forked workers then share its weight pages through copy-on-write
+# instead of each loading their own copy
+if PRELOAD_MODEL:
+    if use_onnx_backend():
+        # ONNX Runtime sessions are not fork-safe, so each worker must create its own
+        logger.warning("PRELOAD_MODEL is not supported with the ONNX Runtime backend, workers will load the model at startup")
+    else:
+        # Load single-threaded so no OpenMP thread pool exists yet when the workers
+        # fork (it can deadlock in the children); restoring the count only sets the
+        # size of the pool each worker creates on its first request
+        torch.set_num_threads(1)
+        try:
+            load_model()
+            model_preloaded = True
+        except Exception as e:
+            logger.error(f"Error preloading model, workers will load it at startup: {str(e)}")
+        torch.set_num_threads(NUM_THREADS)
+
+@torch.inference_mode()
+def run_batch(batch_ids: List[List[int]]) -> torch.Tensor:
+    """Classify a batch of pre-tokenized texts in a single forward pass"""
+    # Pad the whole batch to the bucket of its longest text, reusing that bucket's buffers.
+    # Only one batch runs at a time on inference_executor, so the buffers are never shared.
+    ids_buf, mask_buf = BUCKET_BUFFERS[get_bucket(max(len(ids) for ids in batch_ids))]
+    input_ids = ids_buf[:len(batch_ids)]
+    attention_mask = mask_buf[:len(batch_ids)]
+    
+    input_ids.fill_(tokenizer.pad_token_id or 0)
+    attention_mask.zero_()
+    for row, ids in enumerate(batch_ids):
+        input_ids[row, :len(ids)].copy_(torch.as_tensor(ids))
+        attention_mask[row, :len(ids)] = 1
+    
+    logits = model(input_ids, attention_mask)[0]
+    # Sigmoid is applied per request, only to the logits that pass the threshold
+    return logits.float()
+
+async def batch_worker():
+    """Collect concurrent prediction requests and run them as one batch"""
+    loop = asyncio.get_running_loop()
+    
+    while True:
+        batch = [await batch_queue.get()]
         
-    except Exception as e:
-        model_load_error = str(e)
-        logger.error(f"Error loading model: {str(e)}")
-        raise e
-    finally:
-        model_loading = False
+        # Drain more requests until the batch is full or the wait window closes
+        deadline = loop.time() + BATCH_MAX_WAIT
+        while len(batch) < MAX_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(batch_queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        
+        # Skip requests whose callers have already gone away
+        batch = [(ids, future) for ids, future in batch if not future.done()]
+        if not batch:
+            continue
+        
+        try:
+            # Run the forward pass off the event loop so new requests keep queueing
+            logits = await loop.run_in_executor(inference_executor, run_batch, [ids for ids, _ in batch])
+        except Exception as e:
+            logger.error(f"Error during batch prediction: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+        
+        logger.debug("Processed batch of %d requests", len(batch))
+        for (_, future), row in zip(batch, logits):
+            if not future.done():
+                future.set_result(row)
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize the application"""
+    global batch_queue, batch_worker_task, model_ready, model_load_lock, model_load_task
+    
     logger.info("Application starting up...")
-    # Don't load model on startup to avoid timeout
-    # Model will be loaded on first request instead
+    # Queue and worker are created here so they bind to the server's event loop
+    batch_queue = asyncio.Queue()
+    batch_worker_task = asyncio.create_task(batch_worker())
+    
+    # Start loading the model without blocking startup, so liveness probes pass
+    model_ready = asyncio.Event()
+    model_load_lock = asyncio.Lock()
+    if model_preloaded:
+        model_ready.set()  # Loaded before this worker was forked
+    else:
+        model_load_task = asyncio.create_task(preload_model())
 
 @app.get("/api")
 async def root():
@@ -125,7 +491,7 @@ async def root():
 @app.get("/api/health")
 async def health_check():
     """Detailed health check"""
-    global model, tokenizer, model_loading, model_load_error
+    global model_load_error
     
     status = "healthy"
     model_status = "not_loaded"
@@ -133,27 +499,26 @@ async def health_check():
     if model_load_error:
         status = "unhealthy"
         model_status = f"error: {model_load_error}"
-    elif model_loading:
-        model_status = "loading"
-    elif model is not None and tokenizer is not None:
+    elif model_ready.is_set():
         model_status = "loaded"
+    elif model_load_lock.locked():
+        model_status = "loading"
     
     return {
         "status": status,
         "model_status": model_status,
-        "model_name": "wncelrcn/mindmap-MiniLM-goemotions-v1",
+        "model_ready": model_ready.is_set(),
+        "model_name": MODEL_NAME,
         "model_type": "multi-label emotion classification"
     }
 
 @app.post("/api/warmup")
 async def warmup_model():
     """Manually trigger model loading for faster subsequent requests"""
-    global model, tokenizer, model_loading, model_load_error
-    
-    if model is not None and tokenizer is not None:
+    if model_ready.is_set():
         return {"message": "Model already loaded", "status": "ready"}
     
-    if model_loading:
+    if model_load_lock.locked():
         return {"message": "Model is currently loading", "status": "loading"}
     
     try:
@@ -162,78 +527,69 @@ async def warmup_model():
     except Exception as e:
         return {"message": f"Failed to load model: {str(e)}", "status": "error"}
 
-@app.post("/api/predict", response_model=EmotionResponse)
+# EmotionResponse documents the response schema only; the handler returns plain
+# dicts so trusted server output skips Pydantic validation
+@app.post("/api/predict", responses={200: {"model": EmotionResponse}})
 async def predict_emotions(input_data: TextInput, threshold: float = 0.05):
     """
     Predict emotions from the input text using wncelrcn/mindmap-deBERTa-small-goemotions-v2 model
     Supports multi-label classification with configurable threshold
     """
-    global model, tokenizer
+    stripped = input_data.text.strip()
+    if not stripped:
+        raise HTTPException(status_code=400, detail="Text input cannot be empty")
+    
+    # Trivial inputs like "." carry no emotional signal, so skip the forward pass.
+    # Their neutral score of 1.0 is still filtered by the same score > threshold rule.
+    if len("".join(stripped.split())) < MIN_TEXT_LENGTH:
+        return {
+            "success": True,
+            "emotions": [] if threshold >= 1.0 else [{"label": "neutral", "score": 1.0}],
+            "text_analyzed": input_data.text
+        }
     
-    # Load model on first request if not already loaded
-    if model is None or tokenizer is None:
+    # The model is preloaded at startup; until then, ask clients to retry
+    if not model_ready.is_set():
         if model_load_error:
             raise HTTPException(status_code=500, detail=f"Model failed to load: {model_load_error}")
-        
-        try:
-            await load_model_async()
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to load model: {str(e)}")
-    
-    if not input_data.text.strip():
-        raise HTTPException(status_code=400, detail="Text input cannot be empty")
+        raise HTTPException(status_code=503, detail="Model not ready")
     
     try:
-        logger.info(f"Analyzing text: {input_data.text[:100]}...")
+        logger.info("Analyzing text: %s...", input_data.text[:100])
         
-        # Tokenize input
-        inputs = tokenizer(
-            input_data.text, 
-            return_tensors="pt", 
-            truncation=True, 
-            padding=True, 
+        # Tokenize in a thread so long inputs don't block the event loop
+        encoding = await asyncio.to_thread(
+            tokenizer,
+            input_data.text,
+            truncation=True,
             max_length=512
         )
         
-        # Get prediction
-        with torch.no_grad():
-            outputs = model(**inputs)
-            logits = outputs.logits
-            # Apply sigmoid for multi-label classification
-            probs = torch.sigmoid(logits)[0]
+        # Queue the tokens for the batch worker and wait for its row of logits
+        future = asyncio.get_running_loop().create_future()
+        await batch_queue.put((encoding["input_ids"], future))
+        logits = await future
         
-        # Use model's config labels if available, otherwise use our predefined labels
-        labels = getattr(model.config, 'id2label', None)
-        if labels and len(labels) == len(probs) and not any(label.startswith('LABEL_') for label in labels.values()):
-            # Model config has proper labels
-            logger.debug("Using model config labels")
-            label_list = [labels[i] for i in range(len(labels))]
-        else:
-            # Fall back to our predefined labels
-            logger.debug("Using predefined GoEmotions labels")
-            label_list = GOEMOTIONS_LABELS
-            if len(probs) != len(GOEMOTIONS_LABELS):
-                logger.warning(f"Model output size ({len(probs)}) doesn't match expected labels ({len(GOEMOTIONS_LABELS)})")
-        
-        # Filter predictions above threshold and create emotion predictions
-        emotions = []
-        for i, prob in enumerate(probs):
-            prob_value = float(prob)
-            if prob_value > threshold and i < len(label_list):
-                label = label_list[i]
-                emotions.append(EmotionPrediction(label=label, score=prob_value))
+        # Filter predictions above threshold in logit space, then apply sigmoid
+        # (multi-label classification) only to the survivors
+        mask = logits > logit_threshold(threshold)
+        indices = torch.nonzero(mask, as_tuple=True)[0].tolist()
+        scores = torch.sigmoid(logits[mask]).tolist()
+        emotions = [{"label": LABEL_LIST[i], "score": score} for i, score in zip(indices, scores)]
         
         # Sort by score (highest first)
-        emotions.sort(key=lambda x: x.score, reverse=True)
+        emotions.sort(key=lambda x: x["score"], reverse=True)
         
-        logger.info(f"Found {len(emotions)} emotions above threshold {threshold}")
-        logger.info(f"Top predictions: {[(e.label, f'{e.score:.3f}') for e in emotions[:5]]}")
+        # Only build the log strings when INFO is enabled (production often runs at WARNING)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"Found {len(emotions)} emotions above threshold {threshold}")
+            logger.info(f"Top predictions: {[(e['label'], format(e['score'], '.3f')) for e in emotions[:5]]}")
         
-        return EmotionResponse(
-            success=True,
-            emotions=emotions,
-            text_analyzed=input_data.text
-        )
+        return {
+            "success": True,
+            "emotions": emotions,
+            "text_analyzed": input_data.text
+        }
         
     except Exception as e:
         logger.error(f"Error during prediction: {str(e)}")
@@ -242,4 +598,12 @@ async def predict_emotions(input_data: TextInput, threshold: float = 0.05):
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 10000))
-    uvicorn.run(app, host="0.0.0.0", port=port) 
\ No newline at end of file
+    # Every worker loads its own copy of the model, so prefer a single worker:
+    # it already batches concurrent requests into one forward pass
+    workers = int(os.environ.get("WEB_WORKERS", 1))
+    uvicorn.run(
+        "main:app" if workers > 1 else app,  # Multiple workers need an import string
+        host="0.0.0.0",
+        port=port,
+        workers=workers  # loop/http default to "auto", which picks uvloop and httptools when installed
+    )
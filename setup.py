@@ -5,6 +5,12 @@ Setup script for the Emotion Analysis API backend
 import subprocess
 import sys
 import os
+import importlib.util
+
+# Resolved the same way as in main.py, so the server finds what this script bakes
+MODEL_NAME = "wncelrcn/mindmap-MiniLM-goemotions-v1"
+MODEL_DIR = os.environ.get("MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_dir"))
+ONNX_MODEL_DIR = os.environ.get("ONNX_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_onnx_q"))
 
 def run_command(command, description):
     """Run a shell command and handle errors"""
@@ -18,6 +24,43 @@ def run_command(command, description):
         print(f"Error: {e.stderr}")
         return False
 
+def bake_model():
+    """Download the model once and save it locally as safetensors"""
+    import shutil
+    import tempfile
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    
+    # Download into a throwaway cache so the image doesn't keep a second copy
+    cache_dir = tempfile.mkdtemp()
+    try:
+        model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME, cache_dir=cache_dir)
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, cache_dir=cache_dir)
+        model.save_pretrained(MODEL_DIR, safe_serialization=True)
+        tokenizer.save_pretrained(MODEL_DIR)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    
+    print(f"✅ Model saved to {MODEL_DIR}")
+    
+    # Export to ONNX and quantize to int8 for the ONNX Runtime backend (optional)
+    if importlib.util.find_spec("optimum") is None:
+        print("⚠️ optimum not installed (see requirements-onnx.txt), skipping ONNX export")
+        return
+    
+    optimum_cli = f'"{sys.executable}" -m optimum.commands.optimum_cli'
+    export_dir = tempfile.mkdtemp()  # Unquantized export, only needed as quantizer input
+    exported = run_command(
+        f'{optimum_cli} export onnx --model "{MODEL_DIR}" --task text-classification "{export_dir}"',
+        "Exporting model to ONNX"
+    ) and run_command(
+        f'{optimum_cli} onnxruntime quantize --avx512_vnni --onnx_model "{export_dir}" -o "{ONNX_MODEL_DIR}"',
+        "Quantizing ONNX model to int8"
+    )
+    shutil.rmtree(export_dir, ignore_errors=True)
+    if not exported:
+        shutil.rmtree(ONNX_MODEL_DIR, ignore_errors=True)
+        print("⚠️ ONNX export skipped, the server will use the PyTorch model")
+
 def main():
     """Set up the backend environment"""
     print("Setting up Emotion Analysis API Backend")
@@ -39,15 +82,25 @@ def main():
     if sys.platform == "win32":
         activate_cmd = "venv\\Scripts\\activate"
         pip_cmd = "venv\\Scripts\\pip"
+        python_cmd = "venv\\Scripts\\python"
     else:
         activate_cmd = "source venv/bin/activate"
         pip_cmd = "venv/bin/pip"
+        python_cmd = "venv/bin/python"
     
     # Install dependencies
     install_cmd = f"{pip_cmd} install -r requirements.txt"
     if not run_command(install_cmd, "Installing dependencies"):
         sys.exit(1)
     
+    # The ONNX Runtime backend is optional, so the server still works without it
+    if not run_command(f"{pip_cmd} install -r requirements-onnx.txt", "Installing ONNX Runtime backend"):
+        print("⚠️ Continuing without ONNX Runtime, the server will use the PyTorch model")
+    
+    # Bake the model locally so the server starts without hitting the Hub
+    if not run_command(f"{python_cmd} setup.py --bake-model", "Downloading model"):
+        sys.exit(1)
+    
     print("\n" + "=" * 50)
     print("✅ Backend setup completed successfully!")
     print("\nTo start the server:")
@@ -62,4 +115,7 @@ def main():
     print("   python start_server.py")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    if "--bake-model" in sys.argv:
+        bake_model()
+    else:
+        main() 
\ No newline at end of file